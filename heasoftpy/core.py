@@ -1,6 +1,7 @@
 
 from collections import OrderedDict
 import subprocess
+import copy
 import os
 import re
 import sys
@@ -9,6 +10,55 @@ import selectors
 import logging
 
 
+# path to the fhelp executable; set on first use by _fhelp
+_FHELP_CMD = None
+
+
+def _fhelp():
+    """Return the path to $HEADAS/bin/fhelp, computing it only once"""
+    global _FHELP_CMD
+    if _FHELP_CMD is None:
+        _FHELP_CMD = os.path.join(os.environ['HEADAS'], 'bin', 'fhelp')
+    return _FHELP_CMD
+
+
+# parsed parameters of system .par files; filled by HSPTask.read_pfile
+_PFILE_CACHE = {}
+
+
+# accepted string values for yes/no inputs, and the numeric parameter types
+_YES_VALUES = frozenset(('y', 'yes', 'true'))
+_NO_VALUES  = frozenset(('n', 'no', 'false'))
+_NUM_TYPES  = frozenset(('r', 'i'))
+
+# translation table that removes quotes from numeric values
+_QUOTE_STRIP = str.maketrans('', '', '\'"')
+
+# python type for each parameter type in the .par files
+_TYPE_SWITCH = { 'i': int, 's': str , 'f': str, 'b': bool,
+                 'r': float, 'fr':str, 'd': str, 'g': str, 'fw': str}
+
+
+# template for the wrapper functions written by HSPTask.generate_fcn_code
+_FCN_TEMPLATE = """
+
+import sys
+import os
+import subprocess
+
+from ..core import HSPTask, HSPTaskException
+
+
+def {pyname}(args=None, **kwargs):
+    r\"""
+{docs}
+    \"""
+
+    {pyname}_task = HSPTask(name="{name}")
+    return {pyname}_task(args, **kwargs)
+
+        """
+
 
 class HSPTaskException(Exception):
     """A simple exception class"""
@@ -161,7 +211,7 @@ class HSPTask:
         # do we have an explicit stderr
         stderr = user_pars.get('stderr', False)
         if not isinstance(stderr, bool):
-            stderr = ((isinstance(stderr, str) and stderr.strip().lower() in ['y', 'yes', 'true'])
+            stderr = ((isinstance(stderr, str) and stderr.strip().lower() in _YES_VALUES)
                       or isinstance(stderr, int) and stderr > 0)
         self.stderr = stderr
         
@@ -171,7 +221,7 @@ class HSPTask:
             # in case noprompt is task parameter, we look for py_noprompt
             noprompt = user_pars.get('py_noprompt', False)
         if not isinstance(stderr, bool):
-            noprompt = ((isinstance(noprompt, str) and noprompt.strip().lower() in ['y', 'yes', 'true'])
+            noprompt = ((isinstance(noprompt, str) and noprompt.strip().lower() in _YES_VALUES)
                           or isinstance(noprompt, int) and noprompt > 0)
         self._noprompt = noprompt
         
@@ -188,9 +238,9 @@ class HSPTask:
         if isinstance(verbose, bool):
             verbose = 1 if verbose else 0
         elif isinstance(verbose, str):
-            if verbose.strip().lower() in ['y', 'yes', 'true']:
+            if verbose.strip().lower() in _YES_VALUES:
                 verbose = 1
-            elif verbose.strip().lower() in ['n', 'no', 'false']:
+            elif verbose.strip().lower() in _NO_VALUES:
                 verbose = 0
             else:
                 try:
@@ -304,8 +354,7 @@ class HSPTask:
             if usr_params[par] is None:
                 usr_params[par] = 'NONE'
         # '$( )' ensures empty string are passed correctly with subprocess
-        cmd_params = ['{}={}'.format(par, val if val!='' else '$( )') 
-                      for par,val in usr_params.items()]
+        cmd_params = [f"{par}={val if val!='' else '$( )'}" for par,val in usr_params.items()]
 
         
         # the task executable
@@ -320,7 +369,8 @@ class HSPTask:
             
         
         cmd_list = exec_cmd + cmd_params
-        proc = subprocess.Popen(cmd_list, stdout=subprocess.PIPE, stderr=stderr, env=os.environ.copy())
+        # the child inherits os.environ, so there is no need to pass a copy
+        proc = subprocess.Popen(cmd_list, stdout=subprocess.PIPE, stderr=stderr)
         
         # ---------------------------------------------------- #
         # if verbose, we need to both print and capture output #
@@ -355,21 +405,38 @@ class HSPTask:
         name = self.taskname
         
         # call fhelp; assume HEADAS is defined #
-        cmd  = os.path.join(os.environ['HEADAS'], 'bin/fhelp')
+        cmd  = _fhelp()
+        proc_out, proc_err = None, None
         try:
-            proc = subprocess.Popen([cmd, f'task={name}'], stdin=subprocess.PIPE,
-                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            proc_out, proc_err = proc.communicate()
-        except:
+            proc = subprocess.run([cmd, f'task={name}'], stdin=subprocess.DEVNULL,
+                                  capture_output=True, check=False)
+            proc_out, proc_err = proc.stdout, proc.stderr
+        except OSError:
             # in case it is a .py task
             try:
-                proc = subprocess.Popen([cmd, f'task={name}.py'], stdin=subprocess.PIPE,
-                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                proc_out, proc_err = proc.communicate()
-            except:
+                proc = subprocess.run([cmd, f'task={name}.py'], stdin=subprocess.DEVNULL,
+                                      capture_output=True, check=False)
+                proc_out, proc_err = proc.stdout, proc.stderr
+            except OSError:
                 print(f'Failed in running fhelp to obtain docs for {name}')
         # ---------- #
 
+        return HSPTask._fhelp_text(name, proc_out, proc_err)
+    
+    
+    @staticmethod
+    def _fhelp_text(name, proc_out, proc_err):
+        """Convert the output of fhelp for task name into the docs text
+        
+        Args:
+            name: name of the task
+            proc_out: bytes written by fhelp to stdout
+            proc_err: bytes written by fhelp to stderr
+        
+        Return:
+            str of documentation
+        
+        """
         # convert fhelp output from byte to str #
         try:
             if proc_err is None or len(proc_err) != 0:
@@ -451,7 +518,7 @@ class HSPTask:
         
         # write the updated parameter list #
         defaults = self.default_params
-        ptxt = ''
+        plines = []
         for par_name in self.par_names:
             par = getattr(self, par_name)
             
@@ -464,11 +531,11 @@ class HSPTask:
                 val = f'"{val}"'
             
             # write #
-            ptxt += (f'{par.pname},{par.type},{par.mode},'
-                     f'{val},{par.min},{par.max},\"{par.prompt}\"\n')
+            plines.append(f'{par.pname},{par.type},{par.mode},'
+                          f'{val},{par.min},{par.max},\"{par.prompt}\"\n')
             
         with open(pfile, 'w') as pf:
-            pf.write(ptxt)
+            pf.write(''.join(plines))
         # -------------------------------- #
         
         
@@ -489,15 +556,32 @@ class HSPTask:
         if not os.path.exists(pfile):
             raise IOError(f'parameter file {pfile} not found')
         
-        params = []
+        # files in $HEADAS/syspfiles are not modified by the tasks, so their
+        # parsed parameters are cached, keyed by the file modification time and size
+        cache_key = None
+        if 'HEADAS' in os.environ:
+            sys_pdir = os.path.join(os.environ['HEADAS'], 'syspfiles')
+            if os.path.dirname(os.path.abspath(pfile)) == os.path.abspath(sys_pdir):
+                stat = os.stat(pfile)
+                cache_key = (os.path.abspath(pfile), stat.st_mtime_ns, stat.st_size)
+                if cache_key in _PFILE_CACHE:
+                    return [copy.copy(par) for par in _PFILE_CACHE[cache_key]]
+        
+        # par files are small, so read the whole file at once
         with open(pfile, 'r') as fp:
-            for line in fp:
+            lines = fp.read().splitlines()
+        
+        params = []
+        for line in lines:
 
-                # make sure we have a line with information
-                if line.startswith('#') or len(line.split(',')) < 6:
-                    continue
+            # make sure we have a line with information; count avoids building the split list
+            if line.startswith('#') or line.count(',') < 5:
+                continue
 
-                params.append(HSPParam(line))
+            params.append(HSPParam(line))
+        
+        if cache_key is not None:
+            _PFILE_CACHE[cache_key] = [copy.copy(par) for par in params]
         
         return params
     
@@ -524,20 +608,16 @@ class HSPTask:
         # split on both (:,;)
         pfiles = re.split(';|:', os.environ['PFILES'])
         
-        # check a .par file exists anywhere
-        found = False
+        # check a .par file exists anywhere; the first one found is used
+        pfile = None
         for pf in pfiles:
-            if os.path.exists(os.path.join(pf, f'{name}.par')):
-                found = True
+            loc_pfile = os.path.join(pf, f'{name}.par')
+            if os.path.exists(loc_pfile):
+                pfile = loc_pfile
                 break
-        if not found:
+        if pfile is None:
             raise HSPTaskException(f'No .par file found for task {name}')
         
-        # user pfile; assumed to be the first one in pfiles
-        loc_pfile = os.path.join(pf, f'{name}.par')
-    
-        pfile = loc_pfile if os.path.exists(loc_pfile) else sys_pfile
-        
         # if return_user, we should never return sys_pfile because, now we preparing to write
         # create ~/pfiles if needed.
         if return_user and pfile == sys_pfile:
@@ -595,26 +675,29 @@ class HSPTask:
         return proc_out, proc_err    
     
         
-    def _generate_fcn_docs(self, fhelp=False):
+    def _generate_fcn_docs(self, fhelp=False, task_docs=None):
         """Generation standard function docstring from .par file
 
         Additional help is generated by task_docs, which, in the case of heasoft
-        tools, is generated with fhelp
+        tools, is generated with fhelp. If task_docs is given, it is used 
+        instead of calling fhelp.
 
         """
 
 
         # parameter description #
-        parsDesc = ''
+        parsDesc = []
         for par_name in self.par_names:
             par = getattr(self, par_name)
-            parsDesc += f'\n    {par.pname:12} {"(Req)" if par.isReq else "":6}:'
-            parsDesc += f'  {par.prompt} (default: {par.default}) '
+            parsDesc.append(f'\n    {par.pname:12} {"(Req)" if par.isReq else "":6}:'
+                            f'  {par.prompt} (default: {par.default}) ')
+        parsDesc = ''.join(parsDesc)
         # --------------------- #
 
         # get extra docs from the task #
         # do this only if fhelp is True; i.e. genearating wrappers
-        task_docs = self.task_docs() if fhelp else ''
+        if task_docs is None:
+            task_docs = self.task_docs() if fhelp else ''
 
         # put it all together #
         docs = f"""
@@ -628,35 +711,22 @@ class HSPTask:
         """
         return docs
 
-    def generate_fcn_code(self):
+    def generate_fcn_code(self, task_docs=None):
         """Create python function for task_name
+        
+        Args:
+            task_docs: extra docs text to add to the docstring. If None,
+                it is obtained by calling self.task_docs()
 
         """
         task_name   = self.taskname
         task_pyname = self.pytaskname
 
         # generate docstring
-        docs = self._generate_fcn_docs(fhelp=True)
+        docs = self._generate_fcn_docs(fhelp=True, task_docs=task_docs)
 
         # generate function text
-        fcn = f"""
-
-import sys
-import os
-import subprocess
-
-from ..core import HSPTask, HSPTaskException
-
-
-def {task_pyname}(args=None, **kwargs):
-    r\"""
-{docs}
-    \"""
-
-    {task_pyname}_task = HSPTask(name="{task_name}")
-    return {task_pyname}_task(args, **kwargs)
-
-        """
+        fcn = _FCN_TEMPLATE.format_map({'name': task_name, 'pyname': task_pyname, 'docs': docs})
 
         return fcn
     
@@ -687,14 +757,15 @@ class HSPResult:
     def __str__(self):
         """Print the result object in a clean way"""
         
-        txt  = ('-'*21) + '\n:: Execution Result ::\n' + ('-'*21)
-        txt += f'\n> Return Code: {self.returncode}'
-        txt += f'\n> Output:\n{self.stdout}'
+        # stdout can be long, so collect the parts and join them once
+        txt = [('-'*21) + '\n:: Execution Result ::\n' + ('-'*21),
+               f'\n> Return Code: {self.returncode}',
+               f'\n> Output:\n{self.stdout}']
         if not self.stderr is None:
-            txt += f'\n> Errors: {self.stderr}'
+            txt.append(f'\n> Errors: {self.stderr}')
         ptxt = '\n\t'.join([f'{par:10}: {val}' for par,val in self.params.items()])
-        txt += f'\n> Parameters:\n\t{ptxt}'
-        return txt
+        txt.append(f'\n> Parameters:\n\t{ptxt}')
+        return ''.join(txt)
     
     def __repr__(self):
         return self.__str__()
@@ -708,6 +779,10 @@ class HSPResult:
 class HSPParam():
     """Class for holding task parameters """
     
+    # a task has many parameters, so avoid a __dict__ per instance
+    __slots__ = ('pname', 'type', 'mode', 'default', 'min', 'max', 'prompt', 
+                 'value', 'isReq')
+    
     def __init__(self, line):
         """Initialize a parameter object with a line from the .par file
         
@@ -779,7 +854,7 @@ class HSPParam():
             if user_inp == '':
                 user_inp = self.value
             if self.type == 'b':
-                user_inp = 'no' if user_inp.lower() in ['n', 'no', 'false'] else 'yes'
+                user_inp = 'no' if user_inp.lower() in _NO_VALUES else 'yes'
             
             try:
                 self.value = HSPParam.param_type(user_inp, self.type)
@@ -806,28 +881,26 @@ class HSPParam():
             # already done
             return value
         
-        if value == 'INDEF' and inType in ['r', 'i']:
+        if value == 'INDEF' and inType in _NUM_TYPES:
             return value
         
-        if value == '' and inType in ['r', 'i']:
+        if value == '' and inType in _NUM_TYPES:
             value = 0
             
         if inType == 'b':
-            value = 1 if value.lower() in ['y', 'yes', 'true'] else 0
+            value = 1 if value.lower() in _YES_VALUES else 0
         
-        if inType in ['r', 'i']:
-            value = str(value).replace("'", "").replace('"', '')
+        if inType in _NUM_TYPES:
+            value = str(value).translate(_QUOTE_STRIP)
         
         
         # now proceed with the conversion
-        switcher = { 'i': int, 's': str , 'f': str, 'b': bool,
-                     'r': float, 'fr':str, 'd': str, 'g': str, 'fw': str}
-        
-        if not inType in switcher.keys():
+        converter = _TYPE_SWITCH.get(inType)
+        if converter is None:
             raise ValueError(f'parameter type {inType} is not recognized.')
         
         # TODO: more error trapping here
-        result = switcher[inType](value)
+        result = converter(value)
         
         # keep boolean as yes/no not True/False
         if inType == 'b':
@@ -47,10 +47,9 @@ if 'FTOOLS' in os.environ.keys():
 
     if f_path.exists():
         with open(f_path, 'r') as f:
-            for line in f.readlines():
+            for line in f:
                 if line.startswith('version'):
                     HEA_VERSION = line.split(',')[-1].replace('"', '').rstrip()
-        f.close()
 
     else:
         HEA_VERSION = "DDMMMYYYY_Vxxxxx"
@@ -1,10 +1,20 @@
 import sys
 import os
 import subprocess
-import glob
 import logging
 from .core import HSPTask, HSPTaskException
-    
+
+
+# location of the system pfiles; set on first use by _syspfiles
+_SYSPFILES = None
+
+
+def _syspfiles():
+    """Return $HEADAS/syspfiles, computing it only once"""
+    global _SYSPFILES
+    if _SYSPFILES is None:
+        _SYSPFILES = os.path.join(os.environ['HEADAS'], 'syspfiles')
+    return _SYSPFILES
 
 
 def process_cmdLine(hspTask=None):
@@ -22,29 +32,171 @@ def process_cmdLine(hspTask=None):
         sys.exit(0)
     
     args = {}
-    for val in sys.argv[1:]:
-        val_list = val.strip().split('=')
-        if len(val_list) == 1:
+    argv = sys.argv
+    for i in range(1, len(argv)):
+        val = argv[i]
+        # split at the first =, so values can contain = too
+        par, sep, par_val = val.strip().partition('=')
+        if not sep:
             raise ValueError(f'Unable to parse parameter {val}. Please use: param=value')
-        args[val_list[0]] = val_list[1]
+        args[sys.intern(par)] = par_val
     
     # make verbose=1 default
-    if not 'verbose' in args.keys():
-        args['verbose'] = 1
+    args.setdefault('verbose', 1)
     return args
 
 
-def generate_py_code(tasks=None):
+def _write_file(filename, text):
+    """Write text to filename using low-level os calls
+    
+    The text is encoded once and written with os.write, avoiding
+    the buffering layers of open() for files that are written whole.
+    New files get mode 0o666 minus the umask, as with open().
+    
+    """
+    data = memoryview(text.encode('utf-8'))
+    fd = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+    try:
+        while data:
+            data = data[os.write(fd, data):]
+    finally:
+        os.close(fd)
+
+
+def _help_dir(headas):
+    """Return the folder of the task help files: $LHEA_HELP or $HEADAS/help"""
+    return os.environ.get('LHEA_HELP') or os.path.join(headas, 'help')
+
+
+def _fhelp_batch(names, njobs=1):
+    """Run fhelp for a list of tasks using a few shell processes
+    
+    Tasks that have a text help file, and no html one, in the help folder 
+    ($LHEA_HELP or $HEADAS/help) are read directly, assuming that fhelp 
+    prints the text file unchanged.
+    For the rest, instead of starting a new process for every task, the 
+    names are split into njobs groups, and for each group one shell loops 
+    over the task names and runs fhelp for each. The shells run at the 
+    same time, and their outputs are read at the same time. The stdout 
+    and stderr of every call are separated by null characters in the 
+    output.
+    
+    Args:
+        names: a list of task names
+        njobs: number of shell processes to run at the same time
+    
+    Return:
+        dict of {name: docs text}, formatted as in HSPTask.task_docs
+    
+    """
+    # this is only needed when installing, so import it here
+    import concurrent.futures
+    
+    docs = {}
+    
+    # tasks with only a plain text help file do not need fhelp; we assume
+    # fhelp prints that file as it is, so read it directly. Tasks that also
+    # have an html help file are left to fhelp.
+    headas   = os.environ['HEADAS']
+    help_dir = _help_dir(headas)
+    try:
+        with os.scandir(help_dir) as it:
+            help_files = {entry.name for entry in it}
+    except OSError:
+        help_files = set()
+    run_names = []
+    for name in names:
+        if f'{name}.txt' in help_files and f'{name}.html' not in help_files:
+            with open(os.path.join(help_dir, f'{name}.txt'), 'rb') as fp:
+                docs[name] = HSPTask._fhelp_text(name, fp.read(), b'')
+        else:
+            run_names.append(name)
+    
+    names = run_names
+    if len(names) == 0:
+        return docs
+    
+    # stdout of fhelp goes to fd 3 (the output pipe), while stderr is
+    # captured and printed after it, so each task gives: out\0err\0
+    script = ('exec 3>&1; for n; do '
+              'err=$("$0" task="$n" 2>&1 >&3 </dev/null); '
+              'printf "\\0%s\\0" "$err"; done')
+    njobs  = max(1, min(njobs, len(names)))
+    groups = [names[i::njobs] for i in range(njobs)]
+    procs  = [subprocess.Popen(['sh', '-c', script, os.path.join(headas, 'bin', 'fhelp')] + group, stdin=subprocess.DEVNULL, 
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+              for group in groups]
+    
+    # read all the pipes at the same time, so no shell is blocked on a full
+    # pipe while we wait for another one to finish
+    with concurrent.futures.ThreadPoolExecutor(max_workers=njobs) as executor:
+        outputs = list(executor.map(lambda proc: proc.communicate()[0], procs))
+    
+    for group, output in zip(groups, outputs):
+        parts = output.split(b'\0')
+        for i, name in enumerate(group):
+            if 2*i + 1 < len(parts):
+                proc_out, proc_err = parts[2*i], parts[2*i + 1]
+            else:
+                proc_out, proc_err = None, None
+            docs[name] = HSPTask._fhelp_text(name, proc_out, proc_err)
+    return docs
+
+
+# file in heasoftpy/fcn that records the inputs used to generate the wrappers
+_STAMP_FILE = '.generated'
+
+
+def _generation_stamp(pfile_dir, include_fhelp):
+    """Return the text that records how the wrappers are generated
+    
+    It contains the heasoftpy version, the HEASoft location and version
+    (the version line in ftools.par, if found), and whether the fhelp 
+    text is included. Existing wrappers are only reused if this text 
+    matches the one saved when they were generated.
+    
+    Args:
+        pfile_dir: the $HEADAS/syspfiles folder
+        include_fhelp: True if the fhelp text is added to the docstrings
+    
+    """
+    from .version import __version__
+    
+    heasoft_version = ''
+    try:
+        with open(os.path.join(pfile_dir, 'ftools.par')) as fp:
+            for line in fp:
+                if line.startswith('version'):
+                    heasoft_version = line.strip()
+    except OSError:
+        pass
+    
+    return (f'heasoftpy: {__version__}\n'
+            f'headas: {os.path.realpath(os.environ["HEADAS"])}\n'
+            f'heasoft: {heasoft_version}\n'
+            f'fhelp: {"yes" if include_fhelp else "no"}\n')
+
+
+def generate_py_code(tasks=None, force=False):
     """Generate python code for the built-in heasoft tools
     
     This is meant to run once when installing the software.
     Find a list of tasks from the .par files in HEADAS/syspfiles.
     For every one, generate the python code in heasoftpy/fcn/
     
+    When generating all tasks, a wrapper is not regenerated if it is
+    newer than its .par file, its help file and the code that generates 
+    it, and if the heasoftpy/HEASoft versions and the fhelp setting are 
+    the same as when it was generated. Tasks given explicitly are 
+    always regenerated.
+    The fhelp text is added to the docstrings unless the environment 
+    variable HEASOFTPY_INCLUDE_FHELP is set to 0.
     
     Args:
         tasks: a list of task names. If None, generate for all in 
             $HEASDAS/syspfiles/*par
+        force: regenerate all wrappers. This is also the case if the 
+            environment variable HEASOFTPY_FORCE_REBUILD is set to 1.
     
     Return:
         None
@@ -54,18 +206,23 @@ def generate_py_code(tasks=None):
     
     # here we are assuming HEADAS is defined. 
     # TODO: check this is the case when we are installying heasoftpy for the firs time
-    if 'HEADAS' in os.environ:
-        pfile_dir = os.path.join(os.environ['HEADAS'], 'syspfiles')
+    headas = os.environ.get('HEADAS')
+    if headas is not None:
+        pfile_dir = os.path.join(headas, 'syspfiles')
     else:
         msg = 'HEADAS not defined. Please initialize Heasoft!'
         logger.error(msg)
         raise HSPTaskException(msg)
         
     
+    # up-to-date wrappers can only be skipped when generating all tasks
+    tasks_all = tasks is None
+    reuse = tasks_all and not force and os.environ.get('HEASOFTPY_FORCE_REBUILD', '0') == '0'
+    
     # list of tasks
     if tasks is None:
-        par_files = glob.glob(f'{pfile_dir}/*.par')
-        tasks     = [os.path.basename(file[:-4]) for file in par_files]
+        with os.scandir(pfile_dir) as it:
+            tasks = [entry.name[:-4] for entry in it if entry.name.endswith('.par')]
     else:
         if not isinstance(tasks, (list, )) and not isinstance(tasks[0], str):
             msg = 'tasks has to be a list of task names'
@@ -74,25 +231,104 @@ def generate_py_code(tasks=None):
     
     
     ntasks = len(tasks)
-    logger.info(f'Installying python wrappers. There are {ntasks} tasks!')
+    logger.info('Installying python wrappers. There are %d tasks!', ntasks)
     
     # loop through the tasks and generate and save the code #
     outDir = os.path.join(os.path.dirname(__file__), 'fcn')
+    os.makedirs(outDir, exist_ok=True)
+
+    # if it is already a python tool, skip
+    # python tools are found with one scan of $HEADAS/bin
+    bin_dir = os.path.join(headas, 'bin')
+    with os.scandir(bin_dir) as it:
+        py_tools = {entry.name[:-3] for entry in it if entry.name.endswith('.py')}
+    # the existing wrappers are only reused if they were generated 
+    # with the same inputs, which are saved in the stamp file
+    include_fhelp = os.environ.get('HEASOFTPY_INCLUDE_FHELP', '1') != '0'
+    stamp      = _generation_stamp(pfile_dir, include_fhelp)
+    stamp_file = os.path.join(outDir, _STAMP_FILE)
+    if reuse:
+        try:
+            with open(stamp_file) as fp:
+                reuse = fp.read() == stamp
+        except OSError:
+            reuse = False
     
-    for it,task_name in enumerate(tasks):
-        logger.info(f'.. {it+1}/{ntasks} install {task_name} ... ')
-        
-        # if it is already a python tool, skip
-        pytask = os.path.join(os.environ['HEADAS'], 'bin', f'{task_name}.py')
-        if os.path.exists(pytask):
-            logger.info(f'.. skipping python tools ... ')
+    # a wrapper is up to date if it is newer than its .par file, its help
+    # file and the code that generates it (core.py and utils.py)
+    if reuse:
+        code_mt = max(os.stat(os.path.join(os.path.dirname(__file__), f)).st_mtime_ns
+                      for f in ['core.py', 'utils.py'])
+        help_dir = _help_dir(headas)
+        try:
+            with os.scandir(help_dir) as it:
+                help_files = {entry.name for entry in it}
+        except OSError:
+            help_files = set()
+        pfile_prefix, out_prefix, help_prefix = pfile_dir + os.sep, outDir + os.sep, help_dir + os.sep
+    
+    wrap_tasks = []
+    for task_name in tasks:
+        if task_name in py_tools:
+            logger.info('.. skipping python tool %s ... ', task_name)
             continue
-        
-        hsp = HSPTask(task_name)
-        fcn = hsp.generate_fcn_code()
-        with open(f'{outDir}/{hsp.pytaskname}.py', 'w') as fp: 
-            fp.write(fcn)
-        logger.info('done!')
+        if reuse:
+            try:
+                in_mt  = max(code_mt, os.stat(f'{pfile_prefix}{task_name}.par').st_mtime_ns)
+                for ext in ['txt', 'html']:
+                    if f'{task_name}.{ext}' in help_files:
+                        in_mt = max(in_mt, os.stat(f'{help_prefix}{task_name}.{ext}').st_mtime_ns)
+                out_mt = os.stat(out_prefix + task_name.replace('-', '_') + '.py').st_mtime_ns
+            except OSError:
+                pass
+            else:
+                if out_mt >= in_mt:
+                    logger.info('.. %s is up to date ... ', task_name)
+                    continue
+        wrap_tasks.append(task_name)
+    
+    # the stamp is removed while wrappers are changing, and written again 
+    # only after all tasks have been generated successfully
+    if len(wrap_tasks) > 0 and os.path.exists(stamp_file):
+        os.remove(stamp_file)
+    
+    # the number of fhelp processes can be set with HEASOFTPY_INSTALL_JOBS
+    njobs  = int(os.environ.get('HEASOFTPY_INSTALL_JOBS', os.cpu_count() or 1))
+    
+    # get the fhelp text for all tasks with njobs processes.
+    # Setting HEASOFTPY_INCLUDE_FHELP=0 leaves it out of the docstrings
+    if include_fhelp:
+        logger.info('Running fhelp for the tasks ...')
+        task_docs = _fhelp_batch(wrap_tasks, njobs)
+    else:
+        task_docs = {task_name: f'Run "fhelp {task_name}" for more help.' 
+                     for task_name in wrap_tasks}
+    
+    ntasks = len(wrap_tasks)
+    for it,task_name in enumerate(wrap_tasks):
+        pytaskname = _generate_one(task_name, outDir, task_docs[task_name])
+        logger.info('.. %d/%d installed %s', it+1, ntasks, pytaskname)
+    
+    # record the inputs, but only if all tasks were generated
+    if tasks_all:
+        _write_file(stamp_file, stamp)
+
+
+def _generate_one(task_name, outDir, task_docs):
+    """Generate and save the python wrapper for a single task
+    
+    Args:
+        task_name: name of the task
+        outDir: directory where the wrapper is written
+        task_docs: the fhelp text to add to the docstring
+    
+    Return:
+        the python name of the task
+    """
+    hsp = HSPTask(task_name)
+    fcn = hsp.generate_fcn_code(task_docs=task_docs)
+    _write_file(f'{outDir}/{hsp.pytaskname}.py', fcn)
+    return hsp.pytaskname
     
 
 def local_pfiles(par_dir=None):
@@ -110,11 +346,11 @@ def local_pfiles(par_dir=None):
     
     # we need heasoft initialized
     if not 'HEADAS' in os.environ:
-        raise HSPTaskExeception('HEADAS not defined. Please initialize heasoft')
+        raise HSPTaskException('HEADAS not defined. Please initialize heasoft')
     
     # do we have PFILES defined for the system pfiles?
     if not 'PFILES' in os.environ:
-        os.environ['PFILES'] = os.path.join(os.environ['HEADAS'], 'syspfiles')
+        os.environ['PFILES'] = _syspfiles()
         
     # did the user provide a directory?
     create = True
@@ -137,4 +373,5 @@ def local_pfiles(par_dir=None):
     
     # if we make here, things are good, so add pDir to PFILES
     os.environ['PFILES'] = f'{pDir};{os.environ["PFILES"]}'
-    return pDir
\ No newline at end of file
+    return pDir
+
@@ -2,10 +2,9 @@
 import sys
 import os
 import logging
-import glob
 import importlib
 import shutil
-import subprocess
+import concurrent.futures
 
 # add heasoftpy location to sys.path as it is not installed yet
 current_dir = os.path.abspath(os.path.dirname(__file__))
@@ -80,43 +79,41 @@ def _create_py_wrappers():
 ## ---------------------------- ##
 ## installing pure-python tools ##
 
+# results of _read_package_setup, keyed by (setupfile, mtime, size)
+_SETUP_CACHE = {}
+
 def _find_py_packages():
     """Get a list of python sub-packages to be installed"""
     # get a list of package names
-    packages = glob.glob(f'{package_dir}/*')
-    packages = [os.path.basename(p) for p in packages if not '__' in p and p[-3:] != '.py']
-    # remove template from the list of packages.
-    if 'template' in packages:
-        packages.remove('template')
+    # one scan of package_dir; symlinked package folders are kept. template is not a package
+    with os.scandir(package_dir) as it:
+        packages = [entry.name for entry in it if entry.is_dir()
+                    and not '__' in entry.name and entry.name != 'template']
 
     # exclude python packages that are not requested by the user.
     # Find the list from the list of folders in the component-level directory
-    component_level = glob.glob('../..')
+    # if the folder cannot be listed (e.g. no read permission), skip the filter
+    try:
+        component_level = set(os.listdir('../..'))
+    except OSError:
+        component_level = set()
     # first make sure we are in a standard location: heacore/heasoftpy/install.py
     # if not, do nothing
     if 'heacore' in component_level:
-        for package in packages:
-            if not package in component_level:
-                # remove package from the list of packages to be installed
-                packages.remove(package)
-
-                # remove the folder completely
+        to_remove = [package for package in packages if not package in component_level]
+        for package in to_remove:
+            # remove the folder; this only succeeds if it is empty
+            try:
                 os.rmdir(os.path.join(package_dir, package))
+            except OSError:
+                pass
+        # remove packages from the list of packages to be installed
+        packages = [package for package in packages if package in component_level]
     
     logger.info(f'Number of packages in heasoftpy/packages: {len(packages)}')
     
     return packages
 
-    # exclude python packages that are not requested by the user.
-    # Find the list from the list of folders in the component-level directory
-    component_level = glob.glob('../..')
-    # first make sure we are in a standard location: heacore/heasoftpy/install.py
-    # if not, do nothing
-    if 'heacore' in component_level:
-        for package in packages:
-            if not package in component_level:
-                # remove package from the list of packages to be installed
-                packages.remove(package)
 
 def _read_package_setup(package):
     """Read setup.py in packages/{package}/"""
@@ -126,6 +123,11 @@ def _read_package_setup(package):
         sys.exit(1)
     else:
         logger.info(f'     setup file found ...')
+        # use the cached result if setup.py has not changed
+        st  = os.stat(setupfile)
+        key = (setupfile, st.st_mtime_ns, st.st_size)
+        if key in _SETUP_CACHE:
+            return _SETUP_CACHE[key]
         # try reading the setup.py file
         try:
             with open(setupfile) as fp:
@@ -144,17 +146,129 @@ def _read_package_setup(package):
                 if len(requirements) == 0 and os.path.exists(reqfile):
                     # try requirements.txt
                     with open(reqfile) as fp:
-                        requirements = [r.strip() for r in fp.readlines() 
-                                        if not r.startswith('#') or len(r) == 0]
+                        requirements = [r.strip() for r in fp.read().splitlines()]
+                    # drop empty and comment lines
+                    requirements = [r for r in requirements if r and not r.startswith('#')]
                 if len(requirements) == 0:
                     logger.info(f'No requirements found for {package}. Assume None')
                 
         except:
             logger.error(f'Cannot process setup.py in {package}. Stopping.')
             raise
+        _SETUP_CACHE[key] = tasks, requirements
     return tasks, requirements
 
 
+def _file_exists(filename, dir_files):
+    """Check if a file exists using one scan per folder
+    
+    Args:
+        filename: full path of the file
+        dir_files: dict of {folder: set of names}, filled as folders are scanned
+    
+    """
+    dirname, basename = os.path.split(filename)
+    if not dirname in dir_files:
+        try:
+            with os.scandir(dirname) as it:
+                dir_files[dirname] = {entry.name for entry in it}
+        except OSError:
+            dir_files[dirname] = set()
+    return basename in dir_files[dirname]
+
+
+def _package_copy_list(package, dir_files):
+    """Read a python sub-package and list the task files to be copied
+    
+    Args:
+        package: name of the package in heasoftpy/packages
+        dir_files: dict of folder listings used by _file_exists
+    
+    Return:
+        a list of (src, dest, mode) for the files to be copied; 
+        mode is None if the file mode is not changed.
+    """
+    logger.info(f'     installing package: {package} ...')
+    # do we have a setup.py file?
+    tasks, requirements = _read_package_setup(package)
+    logger.info(f'     Found {len(tasks)} tasks in {package} ...')
+
+    # try importing the package; this makes sure the package and its
+    # dependencies can be imported before its tools are installed
+    try:
+        tmpmod = importlib.import_module(f'heasoftpy.packages.{package}')
+    except:
+        logger.error(f'Attempting to import "{package}" failed. See error message below.')
+        raise
+    logger.info(f'     package "{package}" sucessfully imported.')
+
+
+    # loop through the task, and install them one by one.
+    copy_list = []
+    exe_prefix = exe_install_dir + os.sep
+    par_prefix = par_install_dir + os.sep
+    hlp_prefix = help_install_dir + os.sep
+    for task in tasks:
+
+        # if task is str, we look for task files in the package
+        # or a directory that has the name of the task
+        if isinstance(task, str):
+            logger.info(f'     installing task: {task}')
+            # look for exec, par and help file:
+            taskdir = os.path.join(package_dir, package, task)
+            if os.path.isdir(taskdir):
+                logger.info(f'     found task package: {taskdir}')
+                exe_file = os.path.join(taskdir, f'{task}.py')
+                par_file = os.path.join(taskdir, f'{task}.par')
+                hlp_file = os.path.join(taskdir, f'{task}.py.html')
+            else:
+                logger.info(f'     searching for task module: {task}')
+                exe_file = os.path.join(package_dir, package, f'{task}.py')
+                par_file = os.path.join(package_dir, package, f'{task}.par')
+                hlp_file = os.path.join(package_dir, package, f'{task}.py.html')
+
+        # we have an explicit dict that points to location of executable and par files
+        elif isinstance(task, dict):
+            logger.info(f'     installing: {list(task.keys())[0]}')
+            exe_file, par_file, hlp_file = [os.path.join(package_dir, package, p) 
+                                      for p in list(task.values())[0]]
+
+        # we don't know how to install the task
+        else:
+            msg = f'Failed processing the setup file for task: {task}'
+            logger.error(msg)
+            raise ValueError(msg)
+
+        # checking all files exist
+        if not _file_exists(exe_file, dir_files):
+            msg = f'Could not find executable {exe_file}'
+            logger.error(msg)
+            raise FileNotFoundError(msg)
+        if not _file_exists(par_file, dir_files):
+            msg = f'Could not find parameter file {par_file}'
+            logger.error(msg)
+            raise FileNotFoundError(msg)
+        if not _file_exists(hlp_file, dir_files):
+            msg = f'Could not find help file {hlp_file}'
+            logger.error(msg)
+            raise FileNotFoundError(msg)
+
+        # copy files to their right location; make the exe file executable #
+        exe_dest = exe_prefix + exe_file.rsplit(os.sep, 1)[-1]
+        par_dest = par_prefix + par_file.rsplit(os.sep, 1)[-1]
+        hlp_dest = hlp_prefix + hlp_file.rsplit(os.sep, 1)[-1]
+        copy_list += [(exe_file, exe_dest, 0o755), (par_file, par_dest, None), 
+                      (hlp_file, hlp_dest, None)]
+    return copy_list
+
+
+def _copy_file(src, dest, mode=None):
+    """Copy src to dest, and set the mode of dest if mode is not None"""
+    shutil.copyfile(src, dest)
+    if mode is not None:
+        os.chmod(dest, mode)
+
+
 def _install_packages(packages):
     """Install a list of python sub-packages.
     
@@ -162,87 +276,28 @@ def _install_packages(packages):
         - reading the package/setup.py to find the list of tasks
         - for each task, make sure we have .par and an executable file
         - move the .par and executable to their locations.
+    
+    The packages are read one at a time, because importing them is not
+    safe in threads; the file copies from all packages then run in a
+    thread pool, as they are independent and I/O bound.
     """
     logger.info('-'*30)
     logger.info('Installing pure-python tools ...')
 
-    exe_list, par_list = [], []
+    dir_files = {}
+    copy_list = []
     for package in packages:
-        logger.info(f'     installing package: {package} ...')
-        # do we have a setup.py file?
-        tasks, requirements = _read_package_setup(package)
-        logger.info(f'     Found {len(tasks)} tasks in {package} ...')
-
-        # try importing the package
-        try:
-            tmpmod = importlib.import_module(f'heasoftpy.packages.{package}')
-        except:
-            logger.error(f'Attempting to import "{package}" failed. See error message below.')
-            raise
-        logger.info(f'     package "{package}" sucessfully imported.')
-
-
-        # loop through the task, and install them one by one.
-        for task in tasks:
-
-            # if task is str, we look for task files in the package
-            # or a directory that has the name of the task
-            if isinstance(task, str):
-                logger.info(f'     installing task: {task}')
-                # look for exec, par and help file:
-                taskdir = os.path.join(package_dir, package, task)
-                if os.path.isdir(taskdir):
-                    logger.info(f'     found task package: {taskdir}')
-                    exe_file = os.path.join(taskdir, f'{task}.py')
-                    par_file = os.path.join(taskdir, f'{task}.par')
-                    hlp_file = os.path.join(taskdir, f'{task}.py.html')
-                else:
-                    logger.info(f'     searching for task module: {task}')
-                    exe_file = os.path.join(package_dir, package, f'{task}.py')
-                    par_file = os.path.join(package_dir, package, f'{task}.par')
-                    hlp_file = os.path.join(package_dir, package, f'{task}.py.html')
-
-            # we have an explicit dict that points to location of executable and par files
-            elif isinstance(task, dict):
-                logger.info(f'     installing: {list(task.keys())[0]}')
-                exe_file, par_file, hlp_file = [os.path.join(package_dir, package, p) 
-                                          for p in list(task.values())[0]]
-
-            # we don't know how to install the task
-            else:
-                msg = f'Failed processing the setup file for task: {task}'
-                logger.error(msg)
-                raise ValueError(msg)
-
-            # checking all files exist
-            if not os.path.exists(exe_file):
-                msg = f'Could not find executable {exe_file}'
-                logger.error(msg)
-                raise FileNotFoundError(msg)
-            if not os.path.exists(par_file):
-                msg = f'Could not find parameter file {par_file}'
-                logger.error(msg)
-                raise FileNotFoundError(msg)
-            if not os.path.exists(hlp_file):
-                msg = f'Could not find help file {hlp_file}'
-                logger.error(msg)
-                raise FileNotFoundError(msg)
-
-            # copy files to their right location #
-            logger.info('     copying task files')
-            exe_dest = os.path.join(exe_install_dir, os.path.basename(exe_file))
-            par_dest = os.path.join(par_install_dir, os.path.basename(par_file))
-            hlp_dest = os.path.join(help_install_dir, os.path.basename(hlp_file))
-
-            # copy files make the exe file executable
-            # uncomment the following once it is real install
-            os.makedirs(exe_install_dir, exist_ok=True)
-            os.makedirs(par_install_dir, exist_ok=True)
-            os.makedirs(help_install_dir, exist_ok=True)
-            shutil.copyfile(exe_file, exe_dest)
-            shutil.copyfile(par_file, par_dest)
-            shutil.copyfile(hlp_file, hlp_dest)
-            subprocess.call(['chmod', '755', exe_dest])
+        copy_list += _package_copy_list(package, dir_files)
+
+    if len(copy_list) > 0:
+        logger.info('     copying task files')
+        # the destination folders are the same for all tasks
+        os.makedirs(exe_install_dir, exist_ok=True)
+        os.makedirs(par_install_dir, exist_ok=True)
+        os.makedirs(help_install_dir, exist_ok=True)
+        njobs = min(32, (os.cpu_count() or 1) * 4, len(copy_list))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=njobs) as executor:
+            list(executor.map(_copy_file, *zip(*copy_list)))
     if len(packages) > 0:
         logger.info('Pure-python tools installed sucessfully')
 ## ---------------------------- ##
@@ -83,7 +83,8 @@ def convert_file(file):
     os.system(cmd)
     
     if ext == 'md':
-        os.system(f'rm -f {base_name}.ipynb')
+        if os.path.exists(f'{base_name}.ipynb'):
+            os.remove(f'{base_name}.ipynb')
         
 
         
@@ -6,7 +6,7 @@ from distutils.command.clean import clean
 from setuptools.command.test import test
 import os
 import sys
-import glob
+import shutil
 
 
 class HSPInstallCommand(build_py):
@@ -30,33 +30,46 @@ class HSPCleanCommand(clean):
             file = os.path.join(fcn, f)
             print(f'removing {file}')
             os.remove(file)
+        # the record of how the wrappers were generated
+        stamp = os.path.join(fcn, '.generated')
+        if os.path.exists(stamp):
+            os.remove(stamp)
         cwd = os.getcwd()
-        for d in ['build', 'heasoftpy.egg-info', '__pycache__', 'dist', 
-                  'heasoftpy-install.log', f'{fcn}/__pycache__', '.pytest_cache',
-                 '.eggs', '*.pyc', '.ipynb_checkpoints']:
-            #[os.remove(x) for x in glob.iglob(os.path.join(cwd, "**", d), recursive=True)]
-            for f in glob.iglob(os.path.join(cwd, "**", d), recursive=True):
-                if os.path.exists(f):
-                    os.system(f'rm -rf {f}')
+        targets = {'build', 'heasoftpy.egg-info', '__pycache__', 'dist', 
+                   'heasoftpy-install.log', '.pytest_cache', '.eggs', '.ipynb_checkpoints'}
+        # walk the tree once, removing the targets and *.pyc files
+        for root, dirs, files in os.walk(cwd):
+            for d in dirs:
+                if d in targets:
+                    path = os.path.join(root, d)
+                    if os.path.islink(path):
+                        os.remove(path)
+                    else:
+                        shutil.rmtree(path, ignore_errors=True)
+            # skip removed and hidden folders
+            dirs[:] = [d for d in dirs if not d in targets and not d.startswith('.')]
+            for f in files:
+                if f in targets or f.endswith('.pyc'):
+                    os.remove(os.path.join(root, f))
 
 def build_requirements():
     """Build a list of requirements from the main and sub-packages"""
     # requirements from the core of heasoftpy.
     with open('requirements.txt') as fp:
-        requirements = fp.readlines()
-    requirements = [r.strip() for r in requirements 
-                    if not r.startswith('#') or len(r) == 0]
+        requirements = [r.strip() for r in fp.read().splitlines()]
+    # drop empty and comment lines
+    requirements = [r for r in requirements if r and not r.startswith('#')]
     
     # requirements from sub-packages
+    # a dict keeps the order while dropping duplicates
+    requirements = dict.fromkeys(requirements)
     sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
     import install as hspinstall
     packages = hspinstall._find_py_packages()
     for package in packages:
         tasks, reqs = hspinstall._read_package_setup(package)
-        for r in reqs:
-            if not r in requirements:
-                requirements.append(r)
-    return requirements
+        requirements.update(dict.fromkeys(reqs))
+    return list(requirements)
 
 
 class HSPTestCommand(test):
@@ -2,7 +2,11 @@
 from .context import heasoftpy
 
 import unittest
+import sys
 import os
+import types
+import shutil
+import tempfile
 
 
 class TestUtils(unittest.TestCase):
@@ -40,6 +44,239 @@ class TestUtils(unittest.TestCase):
         oDir = heasoftpy.utils.local_pfiles(pDir)
         self.assertEqual(pDir, oDir)
         self.assertTrue(pDir in os.environ['PFILES'])
+    
+    # command line parsing; values can contain =
+    def test__utils__process_cmdLine(self):
+        argv = sys.argv
+        sys.argv = ['task', 'infile=input.fits', 'expr=a==1']
+        try:
+            args = heasoftpy.utils.process_cmdLine()
+        finally:
+            sys.argv = argv
+        self.assertEqual(args, {'infile': 'input.fits', 'expr': 'a==1', 'verbose': 1})
+    
+    # command line parsing; input without =
+    def test__utils__process_cmdLine_noEqual(self):
+        argv = sys.argv
+        sys.argv = ['task', 'infile']
+        try:
+            with self.assertRaises(ValueError):
+                heasoftpy.utils.process_cmdLine()
+        finally:
+            sys.argv = argv
+
+
+class TestFhelpBatch(unittest.TestCase):
+    """Tests for running fhelp for many tasks at once, using a stub $HEADAS"""
+    
+    # stub fhelp: errtask writes to stderr, big* tasks print a long text,
+    # others print the html or text help file if there is one, or some 
+    # text otherwise
+    fhelp_script = (
+        '#!/bin/sh\n'
+        'task=${1#task=}\n'
+        'if [ "$task" = errtask ]; then echo "partial output"; echo "failed" >&2; exit 1; fi\n'
+        'case "$task" in big*) yes "long help line for $task" | head -n 5000; exit 0;; esac\n'
+        'if [ -f "$HEADAS/help/$task.html" ]; then echo "help from the html file"; exit 0; fi\n'
+        'if [ -f "$HEADAS/help/$task.txt" ]; then cat "$HEADAS/help/$task.txt"; exit 0; fi\n'
+        'printf "help for %s\\nline 2\\n" "$task"\n'
+    )
+    
+    def setUp(self):
+        self.headas = os.environ.get('HEADAS')
+        self.lhea_help = os.environ.pop('LHEA_HELP', None)
+        self.tmpdir = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.tmpdir, 'bin'))
+        os.mkdir(os.path.join(self.tmpdir, 'help'))
+        self.fhelp = os.path.join(self.tmpdir, 'bin', 'fhelp')
+        with open(self.fhelp, 'w') as fp:
+            fp.write(self.fhelp_script)
+        os.chmod(self.fhelp, 0o755)
+        with open(os.path.join(self.tmpdir, 'help', 'txttask.txt'), 'w') as fp:
+            fp.write('help from the text file\n')
+        os.environ['HEADAS'] = self.tmpdir
+        # HSPTask.task_docs caches the fhelp path; reset it for the stub
+        heasoftpy.core._FHELP_CMD = None
+    
+    def tearDown(self):
+        if self.headas is None:
+            os.environ.pop('HEADAS', None)
+        else:
+            os.environ['HEADAS'] = self.headas
+        if self.lhea_help is None:
+            os.environ.pop('LHEA_HELP', None)
+        else:
+            os.environ['LHEA_HELP'] = self.lhea_help
+        heasoftpy.core._FHELP_CMD = None
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+    
+    def _task_docs(self, name):
+        """docs from running fhelp for a single task with HSPTask.task_docs"""
+        return heasoftpy.HSPTask.task_docs(types.SimpleNamespace(taskname=name))
+    
+    # several tasks, with stderr output and a text help file; any number of jobs
+    def test__utils__fhelp_batch(self):
+        names = ['task1', 'errtask', 'txttask', 'task-2', 'task3']
+        for njobs in [1, 2, 10]:
+            docs = heasoftpy.utils._fhelp_batch(names, njobs)
+            self.assertEqual(sorted(docs.keys()), sorted(names))
+            for name in names:
+                self.assertEqual(docs[name], self._task_docs(name))
+        self.assertTrue('help for task-2\nline 2' in docs['task-2'])
+        self.assertTrue('help from the text file' in docs['txttask'])
+        self.assertTrue('No fhelp text' in docs['errtask'])
+    
+    # the output of each shell is larger than a pipe buffer
+    def test__utils__fhelp_batch_large(self):
+        names = [f'bigtask{i}' for i in range(6)] + ['task1']
+        for njobs in [1, 3]:
+            docs = heasoftpy.utils._fhelp_batch(names, njobs)
+            for name in names:
+                self.assertEqual(docs[name], self._task_docs(name))
+        self.assertEqual(docs['bigtask5'].count('long help line for bigtask5'), 5000)
+    
+    # a text help file is only read directly if there is no html one
+    def test__utils__fhelp_batch_html(self):
+        for ext in ['txt', 'html']:
+            with open(os.path.join(self.tmpdir, 'help', f'htmltask.{ext}'), 'w') as fp:
+                fp.write(f'{ext} help\n')
+        docs = heasoftpy.utils._fhelp_batch(['htmltask', 'txttask'], 2)
+        self.assertEqual(docs['htmltask'], self._task_docs('htmltask'))
+        self.assertTrue('help from the html file' in docs['htmltask'])
+        self.assertTrue('help from the text file' in docs['txttask'])
+    
+    # the help files are found in $LHEA_HELP if it is set
+    def test__utils__fhelp_batch_lheaHelp(self):
+        lhea_help = os.path.join(self.tmpdir, 'lhea_help')
+        os.mkdir(lhea_help)
+        with open(os.path.join(lhea_help, 'task1.txt'), 'w') as fp:
+            fp.write('help from lhea_help\n')
+        os.environ['LHEA_HELP'] = lhea_help
+        docs = heasoftpy.utils._fhelp_batch(['task1', 'txttask'], 2)
+        self.assertTrue('help from lhea_help' in docs['task1'])
+        self.assertEqual(docs['txttask'], self._task_docs('txttask'))
+        self.assertTrue('help from the text file' in docs['txttask'])
+    
+    # fhelp does not exist; text help files are still read
+    def test__utils__fhelp_batch_noFhelp(self):
+        os.remove(self.fhelp)
+        docs  = heasoftpy.utils._fhelp_batch(['task1', 'task2', 'txttask'], 2)
+        for name in ['task1', 'task2']:
+            self.assertEqual(docs[name], self._task_docs(name))
+            self.assertTrue('No fhelp text' in docs[name])
+        self.assertTrue('help from the text file' in docs['txttask'])
+
+
+class TestGeneratePyCode(unittest.TestCase):
+    """Tests for reusing up-to-date wrappers, using a stub $HEADAS
+    
+    The wrappers are written to heasoftpy/fcn, so the stub tasks have names 
+    that are not heasoft tasks, and they are removed in tearDown, together 
+    with the stamp file, which is restored if it existed.
+    """
+    
+    tasks   = ['hsptest_a', 'hsptest_b', 'hsptest_c']
+    env_var = ['HEADAS', 'PFILES', 'LHEA_HELP', 'HEASOFTPY_INCLUDE_FHELP', 
+               'HEASOFTPY_FORCE_REBUILD', 'HEASOFTPY_INSTALL_JOBS']
+    
+    def setUp(self):
+        self.environ = {var: os.environ.pop(var, None) for var in self.env_var}
+        self.tmpdir = tempfile.mkdtemp()
+        for subdir in ['bin', 'help', 'syspfiles']:
+            os.mkdir(os.path.join(self.tmpdir, subdir))
+        fhelp = os.path.join(self.tmpdir, 'bin', 'fhelp')
+        with open(fhelp, 'w') as fp:
+            fp.write('#!/bin/sh\nprintf "help for %s\\n" "${1#task=}"\n')
+        os.chmod(fhelp, 0o755)
+        for task in self.tasks:
+            with open(os.path.join(self.tmpdir, 'syspfiles', f'{task}.par'), 'w') as fp:
+                fp.write('infile,s,a,,,,"Input file"\nmode,s,h,"ql",,,\n')
+        with open(os.path.join(self.tmpdir, 'help', 'hsptest_b.txt'), 'w') as fp:
+            fp.write('help from the text file\n')
+        os.environ['HEADAS'] = self.tmpdir
+        os.environ['PFILES'] = os.path.join(self.tmpdir, 'syspfiles')
+        os.environ['HEASOFTPY_INSTALL_JOBS'] = '2'
+        
+        self.fcn_dir = os.path.join(os.path.dirname(heasoftpy.utils.__file__), 'fcn')
+        self.stamp_file = os.path.join(self.fcn_dir, heasoftpy.utils._STAMP_FILE)
+        self.stamp = None
+        if os.path.exists(self.stamp_file):
+            with open(self.stamp_file) as fp:
+                self.stamp = fp.read()
+    
+    def tearDown(self):
+        for task in self.tasks:
+            wrapper = self._wrapper(task)
+            if os.path.exists(wrapper):
+                os.remove(wrapper)
+        if self.stamp is None:
+            if os.path.exists(self.stamp_file):
+                os.remove(self.stamp_file)
+        else:
+            with open(self.stamp_file, 'w') as fp:
+                fp.write(self.stamp)
+        for var, val in self.environ.items():
+            if val is None:
+                os.environ.pop(var, None)
+            else:
+                os.environ[var] = val
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+    
+    def _wrapper(self, task):
+        """path of the generated wrapper of task"""
+        return os.path.join(self.fcn_dir, f'{task}.py')
+    
+    def _generate(self, **kwargs):
+        """run generate_py_code; return the names of the tasks written"""
+        with self.assertLogs('heasoftpy-install', level='INFO') as logs:
+            heasoftpy.utils.generate_py_code(**kwargs)
+        return {msg.split()[-1] for msg in logs.output if ' installed ' in msg}
+    
+    def _make_newer(self, filename):
+        """set the modification time of filename after all the wrappers"""
+        mtime = max(os.stat(self._wrapper(task)).st_mtime for task in self.tasks) + 10
+        os.utime(filename, (mtime, mtime))
+    
+    # first run writes all wrappers and the stamp; a second run writes nothing
+    def test__utils__generate_py_code_reuse(self):
+        self.assertEqual(self._generate(), set(self.tasks))
+        self.assertTrue(os.path.exists(self.stamp_file))
+        with open(self._wrapper('hsptest_b')) as fp:
+            self.assertTrue('help from the text file' in fp.read())
+        self.assertEqual(self._generate(), set())
+        self.assertTrue(os.path.exists(self.stamp_file))
+    
+    # a newer .par file regenerates only the wrapper of that task
+    def test__utils__generate_py_code_newerPfile(self):
+        self._generate()
+        self._make_newer(os.path.join(self.tmpdir, 'syspfiles', 'hsptest_a.par'))
+        self.assertEqual(self._generate(), {'hsptest_a'})
+    
+    # a newer help file regenerates only the wrapper of that task
+    def test__utils__generate_py_code_newerHelp(self):
+        self._generate()
+        self._make_newer(os.path.join(self.tmpdir, 'help', 'hsptest_b.txt'))
+        self.assertEqual(self._generate(), {'hsptest_b'})
+    
+    # changing HEASOFTPY_INCLUDE_FHELP or forcing regenerates all wrappers
+    def test__utils__generate_py_code_rebuild(self):
+        self._generate()
+        os.environ['HEASOFTPY_INCLUDE_FHELP'] = '0'
+        self.assertEqual(self._generate(), set(self.tasks))
+        with open(self._wrapper('hsptest_b')) as fp:
+            self.assertFalse('help from the text file' in fp.read())
+        self.assertEqual(self._generate(), set())
+        self.assertEqual(self._generate(force=True), set(self.tasks))
+        os.environ['HEASOFTPY_FORCE_REBUILD'] = '1'
+        self.assertEqual(self._generate(), set(self.tasks))
+    
+    # explicit tasks are always generated, and the stamp is removed
+    def test__utils__generate_py_code_explicit(self):
+        self._generate()
+        self.assertEqual(self._generate(tasks=['hsptest_c']), {'hsptest_c'})
+        self.assertFalse(os.path.exists(self.stamp_file))
+        self.assertEqual(self._generate(), set(self.tasks))
+        self.assertTrue(os.path.exists(self.stamp_file))
 
         
 if __name__ == '__main__':